@@ -24,14 +24,15 @@ import torch_sparse
 
 # The PyG built-in GCNConv
 from torch_geometric.nn import GCNConv
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
 
 import torch_geometric.transforms as T
 import numpy
 import networkx as nx
-import csv
+import urllib.request
 import torch_geometric.utils
 from torch_geometric.data import Data
-from torch_geometric.data import DataLoader
+from torch_geometric.data import Batch
 from tqdm.notebook import tqdm
 
 
@@ -40,20 +41,30 @@ from tqdm.notebook import tqdm
 
 """#Load Datasets"""
 
+## Each file is downloaded once into ~/.cache and later runs read the local copy
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'cs224w_adni_files')
+
+def read_cached_csv(url):
+  path = os.path.join(cache_dir, os.path.basename(url))
+  if not os.path.exists(path):
+    os.makedirs(cache_dir, exist_ok=True)
+    # Download to a temporary file first so an interrupted download never
+    # leaves a truncated CSV at the cache path
+    urllib.request.urlretrieve(url, path + '.tmp')
+    os.replace(path + '.tmp', path)
+  return pd.read_csv(path)
+
 url1 = 'https://raw.githubusercontent.com/sdos1/cs224w_adni_files/main/protein_adjacency_matrix.csv'
-df1 = pd.read_csv(url1)
+df1 = read_cached_csv(url1)
 # Protein Co-Expression Dataset is now stored in a Pandas Dataframe
-df1.to_csv('protein_adjacency_matrix.csv')
 
 url2 = 'https://raw.githubusercontent.com/sdos1/cs224w_adni_files/main/final_diagnosis.csv'
-df2 = pd.read_csv(url2)
+df2 = read_cached_csv(url2)
 # Diagnosis Dataset is now stored in a Pandas Dataframe
-df2.to_csv('final_diagnosis.csv')
 
 url3 = 'https://raw.githubusercontent.com/sdos1/cs224w_adni_files/main/log_transformed_ADNI_expression_data_with_covariates.csv'
-df3 = pd.read_csv(url3)
+df3 = read_cached_csv(url3)
 # Patient Expression Dataset is now stored in a Pandas Dataframe
-df3.to_csv('log_transformed_ADNI_expression_data_with_covariates.csv')
 
 """# Import graph and patient level data
 
@@ -61,8 +72,8 @@ df3.to_csv('log_transformed_ADNI_expression_data_with_covariates.csv')
 
 
 
-## Save the values into an adjacency matrix
-adj = numpy.loadtxt(open("protein_adjacency_matrix.csv", "rb"), delimiter=",", skiprows=1, usecols=numpy.arange(2, 53))
+## Save the values into an adjacency matrix (column 0 holds the protein names)
+adj = df1.iloc[:, 1:52].to_numpy(dtype=numpy.float32)
 
 
 #Set up graph from adjacency matrix and assign protein name labels
@@ -74,22 +85,12 @@ G = nx.from_numpy_array(adj, parallel_edges=False, create_using=None)
 print(G)
 nx.draw(G, with_labels=True)
 
-## Save the protein expression levels into a matrix
-expression_mat = numpy.loadtxt(open("log_transformed_ADNI_expression_data_with_covariates.csv", "rb"), delimiter=",", skiprows=1, usecols=numpy.arange(16, 67))
+## Save the protein expression levels into a matrix (skipping the covariates)
+expression_mat = df3.iloc[:, 15:66].to_numpy(dtype=numpy.float32)
 # print(expression_mat[50,:])
 
-## Save the diagnosis into a dict matching the label number
-with open("final_diagnosis.csv") as file_name:
-  file_read = csv.reader(file_name)
-  diagnosis_list = list(file_read)
 ## Convert the diagnosis information into a binary classification (1 if AD)
-binary_diagnosis = []
-for i in range(len(diagnosis_list)):
-  if i>0:
-    if diagnosis_list[i][1] == "AD":
-      binary_diagnosis.append(1)
-    else:
-      binary_diagnosis.append(0)
+binary_diagnosis = (df2['final_diagnosis'].to_numpy() == "AD").astype(numpy.int64)
 
 """# Pre-process Data for PyTorch
 
@@ -100,33 +101,45 @@ The high level goal is to create and load a set of graphs (split into test, trai
 
 
 
-x_tensor = torch.from_numpy(expression_mat).float()
-diagnosis_tensor = torch.Tensor(binary_diagnosis).long()
+# The matrices are read as float32, so no further cast is needed
+x_tensor = torch.from_numpy(expression_mat)
+diagnosis_tensor = torch.from_numpy(binary_diagnosis)
 adj_tensor = torch.from_numpy(adj)
 G_convert = torch_geometric.utils.from_networkx(G)
 
 positional_encoder = torch.rand(51,3).float()
 
+## Plain index ranges: iterating them directly avoids the linear scan (and
+## the 0-d tensor result) of `i in tensor` membership tests
 split_idx = {}
-split_idx['train'] = torch.tensor(numpy.arange(0, 149))
-split_idx['valid'] = torch.tensor(numpy.arange(150, 299))
-split_idx['test'] = torch.tensor(numpy.arange(300, 449))
-
-train_list = []
-test_list = []
-valid_list = []
-for i in range(len(diagnosis_tensor)):
-  x_yeet = x_tensor[i,:]
-  x_scalar = torch.t(torch.reshape(x_yeet, (1, len(x_yeet)))).float()
-  x = torch.cat((x_scalar, positional_encoder), 1)
-  y = diagnosis_tensor[i]
-  if (i in split_idx['train']):
-    train_list.append(Data(x=(x), y = y, edge_index=G_convert.edge_index, edge_attr = G_convert.weight))
-    # print(train_list[i])
-  if (i in split_idx['valid']):
-    valid_list.append(Data(x=(x), y = y, edge_index=G_convert.edge_index, edge_attr = G_convert.weight))
-  if (i in split_idx['test']):
-    test_list.append(Data(x=(x), y = y, edge_index=G_convert.edge_index, edge_attr = G_convert.weight))
+split_idx['train'] = range(0, 149)
+split_idx['valid'] = range(150, 299)
+split_idx['test'] = range(300, 449)
+
+## Build the node features for every subject in one contiguous
+## [num_subjects, 51, 4] block: column 0 is the protein expression level and
+## columns 1-3 are the shared positional encoding (broadcast into place). Each
+## Data object below only holds a view feat[i] into this block.
+num_subjects = x_tensor.size(0)
+feat = torch.empty(num_subjects, 51, 4)
+feat[:, :, 0] = x_tensor
+feat[:, :, 1:] = positional_encoder
+
+## The protein graph is identical for every subject, so the symmetric GCN
+## normalization D^{-1/2} A D^{-1/2} is computed once here instead of inside
+## every GCNConv call of the first GCN block
+edge_index_norm, edge_weight_norm = gcn_norm(G_convert.edge_index, G_convert.weight, num_nodes=51, add_self_loops=True)
+## Dense [51, 51] form of the normalized adjacency; row i holds the weights
+## of the messages flowing into node i
+adj_norm = torch_geometric.utils.to_dense_adj(edge_index_norm, edge_attr=edge_weight_norm, max_num_nodes=51)[0].t()
+
+## Every graph shares the same edge_index / edge_attr tensors
+def make_data_list(idx):
+  return [Data(x=feat[i], y = diagnosis_tensor[i], edge_index=edge_index_norm, edge_attr = edge_weight_norm) for i in idx]
+
+train_list = make_data_list(split_idx['train'])
+valid_list = make_data_list(split_idx['valid'])
+test_list = make_data_list(split_idx['test'])
 
 print(train_list)
 
@@ -134,10 +147,29 @@ device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
 # If you use GPU, the device should be cuda
 print('Device: {}'.format(device))
+
+## Mixed precision: run the forward pass in bfloat16 on Ampere+ GPUs (no loss
+## scaling needed since bf16 keeps the fp32 exponent range), fall back to
+## float16 with a GradScaler on older cards, and stay in fp32 on the CPU.
+use_amp = device == 'cuda'
+amp_dtype = torch.bfloat16 if use_amp and torch.cuda.is_bf16_supported() else torch.float16
+scaler = torch.amp.GradScaler('cuda', enabled=use_amp and amp_dtype == torch.float16)
   
-train_loader = DataLoader(train_list, batch_size=32, shuffle=False, num_workers=0)
-valid_loader = DataLoader(valid_list, batch_size=32, shuffle=False, num_workers=0)
-test_loader = DataLoader(test_list, batch_size=32, shuffle=False, num_workers=0)
+torch.backends.cudnn.benchmark = True
+## Let the matmuls and convolutions that still run in fp32 use TF32 tensor
+## cores on Ampere+ GPUs
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cudnn.allow_tf32 = True
+
+## The dataset is small and static, so every mini-batch is collated and moved
+## to the device once here rather than by a DataLoader on every epoch
+def collate_batches(data_list, batch_size=32):
+  return [Batch.from_data_list(data_list[i:i + batch_size]).to(device)
+          for i in range(0, len(data_list), batch_size)]
+
+train_loader = collate_batches(train_list)
+valid_loader = collate_batches(valid_list)
+test_loader = collate_batches(test_list)
 
 """# GCN Model (Base)
 
@@ -151,14 +183,36 @@ args = {
     'dropout': 0.5,
     'lr': 0.001,
     'epochs': 50,
+    'eval_every': 5,
 }
 args
 
+class StaticGCNConv(torch.nn.Module):
+    # GCN layer for a fixed graph that is shared by every sample in the
+    # mini-batch. The normalized adjacency is passed in dense form, so the
+    # neighbourhood aggregation is a single [N, N] x [B, N, C] matmul instead
+    # of sparse message passing, which is much cheaper on a 51 node graph.
+    def __init__(self, in_channels, out_channels):
+        super(StaticGCNConv, self).__init__()
+        self.lin = torch.nn.Linear(in_channels, out_channels, bias=False)
+        self.bias = torch.nn.Parameter(torch.empty(out_channels))
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        torch.nn.init.xavier_uniform_(self.lin.weight)
+        torch.nn.init.zeros_(self.bias)
+
+    def forward(self, x, adj_norm):
+        # x holds the nodes of B graphs stacked as [B * N, C]
+        num_nodes = adj_norm.size(0)
+        h = self.lin(x).view(-1, num_nodes, self.lin.out_features)
+        out = torch.matmul(adj_norm, h)
+        return out.reshape(-1, out.size(-1)) + self.bias
+
 class GCN(torch.nn.Module):
     def __init__(self, input_dim, hidden_dim, output_dim, num_layers,
-                 dropout, return_embeds=False):
-        # Initialisation of self.convs, 
-        # self.bns, and self.softmax.
+                 dropout, return_embeds=False, adj_norm=None):
+        # Initialisation of self.convs and self.bns.
 
         super(GCN, self).__init__()
 
@@ -168,9 +222,6 @@ class GCN(torch.nn.Module):
         # A list of 1D batch normalization layers
         self.bns = None
 
-        # The log softmax layer
-        self.softmax = None
-
         ## Note:
         ##  self.convs has num_layers GCNConv layers
         ##  self.bns has num_layers - 1 BatchNorm1d layers
@@ -188,19 +239,22 @@ class GCN(torch.nn.Module):
         #For the first layer, we go from dimensions input -> hidden
         #For middle layers we go from dimensions hidden-> hidden
         #For the end layer we go from hidden-> output
+        #If a dense normalized adjacency is given, every input graph is assumed
+        #to share it and StaticGCNConv layers are used instead of GCNConv
+
+        self.register_buffer('adj_norm', adj_norm)
+        conv_layer = GCNConv if adj_norm is None else StaticGCNConv
 
         for l in range(num_layers):
           if l==0: #change input output dims accordingly
-            self.convs.append(GCNConv(input_dim, hidden_dim))
+            self.convs.append(conv_layer(input_dim, hidden_dim))
           elif l == num_layers-1:
-            self.convs.append(GCNConv(hidden_dim, output_dim))
+            self.convs.append(conv_layer(hidden_dim, output_dim))
           else:
-            self.convs.append(GCNConv(hidden_dim, hidden_dim))
+            self.convs.append(conv_layer(hidden_dim, hidden_dim))
           if l < num_layers-1: 
             self.bns.append(torch.nn.BatchNorm1d(hidden_dim))
 
-        self.last_conv = GCNConv(hidden_dim, output_dim)
-        self.log_soft = torch.nn.LogSoftmax()
 
         # Probability of an element getting zeroed
         self.dropout = dropout
@@ -214,6 +268,12 @@ class GCN(torch.nn.Module):
         for bn in self.bns:
             bn.reset_parameters()
 
+    def conv(self, conv, x, adj_t, edge_weight):
+        # Static graphs ignore adj_t / edge_weight and use the stored adjacency
+        if self.adj_norm is not None:
+          return conv(x, self.adj_norm)
+        return conv(x, adj_t, edge_weight)
+
     def forward(self, x, adj_t, edge_weight):
         # This function that takes the feature tensor x and
         # edge_index tensor adj_t, and edge_weight and returns the output tensor.
@@ -221,16 +281,19 @@ class GCN(torch.nn.Module):
         out = None
 
         for l in range(len(self.convs)-1):
-          x = self.convs[l](x, adj_t, edge_weight)
+          x = self.conv(self.convs[l], x, adj_t, edge_weight)
           x = self.bns[l](x)
-          x = F.relu(x)
+          # ReLU can overwrite the BN output (BN backward only needs its
+          # input), but dropout must not run in place because ReLU's backward
+          # reads its own output
+          x = F.relu(x, inplace=True)
           x = F.dropout(x, training=self.training)
 
-        x = self.last_conv(x, adj_t, edge_weight)
+        x = self.conv(self.convs[-1], x, adj_t, edge_weight)
         if self.return_embeds is True:
           out = x
         else: 
-          out = self.log_soft(x)
+          out = F.log_softmax(x, dim=-1)
 
         return out
 
@@ -250,15 +313,123 @@ This lets us keep track of which graph each node belongs to.
 
 from ogb.graphproppred.mol_encoder import AtomEncoder
 from torch_geometric.nn import global_add_pool, global_mean_pool
+from torch_geometric.utils import add_remaining_self_loops
+from torch_sparse import SparseTensor
+
+@torch.jit.script
+def asap_attention(score, x, src, dst, num_nodes: int, negative_slope: float,
+                   dropout: float, training: bool):
+    # ASAP's attention step in one scripted function so that the pointwise ops
+    # (LeakyReLU, exp, normalization, dropout, weighting) can be fused instead
+    # of being launched one by one. Computes the softmax of the edge scores
+    # over the incoming edges of every node and the attention weighted sum of
+    # the source features, returning both.
+    score = F.leaky_relu(score, negative_slope)
+    score_max = torch.zeros(num_nodes, dtype=score.dtype, device=score.device)
+    # The max only stabilizes the exp, so it is taken on the detached scores
+    # (as in PyG's softmax) to keep it out of the backward pass
+    score_max = score_max.scatter_reduce(0, dst, score.detach(), 'amax', include_self=False)
+    score = (score - score_max[dst]).exp()
+    score_sum = torch.zeros(num_nodes, dtype=score.dtype, device=score.device).index_add_(0, dst, score)
+    score = score / (score_sum[dst] + 1e-16)
+
+    # Sample attention coefficients stochastically.
+    score = F.dropout(score, p=dropout, training=training)
+
+    v_j = x[src] * score.unsqueeze(-1)
+    out = torch.zeros(num_nodes, v_j.size(1), dtype=v_j.dtype, device=v_j.device).index_add_(0, dst, v_j)
+    return score, out
+
+class CachedASAPooling(torch_geometric.nn.pool.ASAPooling):
+    # ASAPooling whose graph bookkeeping is cached for static inputs.
+    #
+    # The cluster selection (top-k over the fitness scores) depends on the node
+    # features, so the coarsened graphs cannot be cached. What is fixed is the
+    # input of the first pooling round: every mini-batch is a disjoint union
+    # of the same protein graph, which already contains all self loops. With
+    # static_graph=True the self-loop insertion is skipped and the adjacency
+    # SparseTensor is built once per batch layout (keyed by node count) and
+    # reused on every later step and epoch.
+    def __init__(self, *args, **kwargs):
+        super(CachedASAPooling, self).__init__(*args, **kwargs)
+        self._static_adj = {}
+
+    def static_adj(self, edge_index, num_nodes):
+        if num_nodes not in self._static_adj:
+          # No edge weights are passed in, so A is an unweighted pattern
+          self._static_adj[num_nodes] = SparseTensor(row=edge_index[0], col=edge_index[1],
+                                                     sparse_sizes=(num_nodes, num_nodes))
+        return self._static_adj[num_nodes]
+
+    def select_clusters(self, fitness, batch):
+        # Newer PyG releases expose the top-k cluster selection as self.select,
+        # older ones only have the topk helper in topk_pool
+        if hasattr(self, 'select'):
+          return self.select(fitness, batch).node_index
+        from torch_geometric.nn.pool.topk_pool import topk
+        return topk(fitness, self.ratio, batch)
+
+    def forward(self, x, edge_index, edge_weight=None, batch=None, static_graph=False):
+        N = x.size(0)
+
+        if static_graph:
+          A = self.static_adj(edge_index, N)
+        else:
+          edge_index, edge_weight = add_remaining_self_loops(
+              edge_index, edge_weight, fill_value=1., num_nodes=N)
+          A = SparseTensor(row=edge_index[0], col=edge_index[1], value=edge_weight,
+                           sparse_sizes=(N, N))
+
+        if batch is None:
+            batch = edge_index.new_zeros(x.size(0))
+
+        x_pool = x
+        if self.gnn_intra_cluster is not None:
+            x_pool = self.gnn_intra_cluster(x=x, edge_index=edge_index,
+                                            edge_weight=edge_weight)
+
+        x_pool_j = x_pool[edge_index[0]]
+        # Per-node max over the incoming edges (every node has a self loop)
+        x_q = x_pool_j.new_zeros(N, x_pool_j.size(1)).scatter_reduce(
+            0, edge_index[1].view(-1, 1).expand_as(x_pool_j), x_pool_j, 'amax', include_self=False)
+        x_q = self.lin(x_q)[edge_index[1]]
+
+        score = self.att(torch.cat([x_q, x_pool_j], dim=-1)).view(-1)
+        score, x = asap_attention(score, x, edge_index[0], edge_index[1], N,
+                                  self.negative_slope, self.dropout, self.training)
+
+        # Cluster selection.
+        fitness = self.gnn_score(x, edge_index).sigmoid().view(-1)
+        perm = self.select_clusters(fitness, batch)
+        x = x[perm] * fitness[perm].view(-1, 1)
+        batch = batch[perm]
+
+        # Graph coarsening. The sparse-sparse matmuls are not covered by
+        # autocast and need fp32 operands, so the scores are cast back up.
+        S = SparseTensor(row=edge_index[0], col=edge_index[1], value=score.float(), sparse_sizes=(N, N))
+        S = torch_sparse.index_select(S, 1, perm)
+        A = torch_sparse.matmul(torch_sparse.matmul(torch_sparse.t(S), A), S)
+
+        if self.add_self_loops:
+            A = torch_sparse.fill_diag(A, 1.)
+        else:
+            A = torch_sparse.remove_diag(A)
+
+        row, col, edge_weight = A.coo()
+        edge_index = torch.stack([row, col], dim=0)
+
+        return x, edge_index, edge_weight, batch, perm
 
 ### GCN to predict graph property
 class GCN_Graph(torch.nn.Module):
-    def __init__(self, input_dim, hidden_dim, output_dim, num_layers, dropout):
+    def __init__(self, input_dim, hidden_dim, output_dim, num_layers, dropout, adj_norm):
         super(GCN_Graph, self).__init__()
 
         # Node embedding model, initially input_dim=input_dim, output_dim = hidden_dim
+        # Every input graph shares the protein graph, given as the dense
+        # normalized adjacency adj_norm
         self.gnn_node = GCN(input_dim, hidden_dim,
-            hidden_dim, num_layers, dropout, return_embeds=True)
+            hidden_dim, num_layers, dropout, return_embeds=True, adj_norm=adj_norm)
         # Note that the input_dim and output_dim are set to hidden_dim
         # for subsequent layers
         self.gnn_node_2 = GCN(hidden_dim, hidden_dim,
@@ -267,7 +438,7 @@ class GCN_Graph(torch.nn.Module):
         ##Set up pooling layer using ASAPool
         ## For more information please refere to the documentation:
         ## https://pytorch-geometric.readthedocs.io/en/latest/modules/nn.html#torch_geometric.nn.pool.ASAPooling
-        self.asap = torch_geometric.nn.pool.ASAPooling(in_channels = 256, ratio = 0.5, dropout = 0.1, negative_slope = 0.2, add_self_loops = False)
+        self.asap = CachedASAPooling(in_channels = 256, ratio = 0.5, dropout = 0.1, negative_slope = 0.2, add_self_loops = False)
 
         ## Initialize self.pool as a global mean pooling layer
         ## For more information please refer to the documentation:
@@ -305,11 +476,14 @@ class GCN_Graph(torch.nn.Module):
         ## For more information please refer to the documentation:
         ## https://pytorch-geometric.readthedocs.io/en/latest/modules/nn.html#global-pooling-layers
         ## 4. We use a linear layer to predict each graph's property
-        num_graphs = int(len(batch)/51)
+        ## The batch vector is passed through both pooling rounds so that the
+        ## top-k selection happens per graph and post_pool_2[3] maps every
+        ## remaining node to its graph for the final mean pooling
+        num_graphs = batched_data.num_graphs
         post_GCN_1 = self.gnn_node(embed, edge_index, edge_weight)
-        post_pool_1 = self.asap(post_GCN_1, edge_index)
+        post_pool_1 = self.asap(post_GCN_1, edge_index, batch=batch, static_graph=True)
         post_GCN_2 = self.gnn_node_2(post_pool_1[0], post_pool_1[1], post_pool_1[2])
-        post_pool_2 = self.asap(post_GCN_2, post_pool_1[1])
+        post_pool_2 = self.asap(post_GCN_2, post_pool_1[1], batch=post_pool_1[3])
         ultimate_gcn = self.gnn_node_2(post_pool_2[0], post_pool_2[1], post_pool_2[2])
 
         glob_pool = self.pool(ultimate_gcn, post_pool_2[3], num_graphs)  
@@ -325,26 +499,24 @@ def train(model, device, data_loader, optimizer, loss_fn):
 
 
     for step, batch in enumerate(tqdm(data_loader, desc="Iteration")):
-      batch = batch.to(device)
-
       if batch.x.shape[0] == 1 or batch.batch[-1] == 0:
           pass
       else:
-        ## ignore nan targets (unlabeled) when computing training loss.
-        is_labeled = batch.y == batch.y
-
         ## We first:
         ## 1. Zero grad the optimizer
         ## 2. Feed the data into the model
-        ## 3. Use `is_labeled` mask to filter output and labels
-        ## 4. Feed the output and label to the loss_fn
+        ## 3. Feed the output and label to the loss_fn
+        ## Every subject has a diagnosis, so no NaN (unlabeled) targets need
+        ## to be masked out.
 
-        optimizer.zero_grad()
-        out = model(batch)
-        loss = loss_fn(out[is_labeled].squeeze(), batch.y[is_labeled].to(torch.float32).squeeze())              
-        
-        loss.backward()
-        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+        with torch.autocast(device_type='cuda', dtype=amp_dtype, enabled=use_amp):
+          out = model(batch)
+          loss = loss_fn(out.squeeze(), batch.y.to(torch.float32).squeeze())
+
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
 
     return loss.item()
 
@@ -355,13 +527,13 @@ def eval(model, device, loader, evaluator, save_model_results=False, save_file=N
     y_pred = []
 
     for step, batch in enumerate(tqdm(loader, desc="Iteration")):
-        batch = batch.to(device)
-
         if batch.x.shape[0] == 1:
             pass
         else:
-            with torch.no_grad():
+            with torch.no_grad(), torch.autocast(device_type='cuda', dtype=amp_dtype, enabled=use_amp):
                 pred = model(batch)
+            # numpy has no bfloat16, so cast predictions back to fp32
+            pred = pred.float()
 
             y_true.append(batch.y.view(pred.shape).detach().cpu())
             y_pred.append(pred.detach().cpu())
@@ -396,7 +568,13 @@ from ogb.graphproppred import PygGraphPropPredDataset, Evaluator
 if 'IS_GRADESCOPE_ENV' not in os.environ:
   model = GCN_Graph(4, args['hidden_dim'],
               1, args['num_layers'],
-              args['dropout']).to(device)
+              args['dropout'], adj_norm).to(device)
+  ## Compile the first GCN block, whose input shapes only depend on the batch
+  ## size, so that the conv -> BN -> ReLU -> dropout chain is fused and replayed
+  ## as a CUDA graph. The pooling rounds produce data dependent graph sizes
+  ## (and call into torch_sparse), so they stay in eager mode.
+  if device == 'cuda':
+    model.gnn_node.compile(mode='reduce-overhead', fullgraph=False, dynamic=False)
   evaluator = Evaluator(name='ogbg-molhiv')
 
   dataset = PygGraphPropPredDataset(name='ogbg-molhiv')
@@ -416,20 +594,27 @@ if 'IS_GRADESCOPE_ENV' not in os.environ:
     print('Training...')
     loss = train(model, device, train_loader, optimizer, loss_fn)
 
+    ## The validation set drives model selection and is scored every epoch;
+    ## train and test are only reported every eval_every epochs
     print('Evaluating...')
-    train_result = eval(model, device, train_loader, evaluator)
     val_result = eval(model, device, valid_loader, evaluator)
-    test_result = eval(model, device, test_loader, evaluator)
-
-    train_acc, valid_acc, test_acc = train_result[dataset.eval_metric], val_result[dataset.eval_metric], test_result[dataset.eval_metric]
+    valid_acc = val_result[dataset.eval_metric]
     if valid_acc > best_valid_acc:
         best_valid_acc = valid_acc
         best_model = copy.deepcopy(model)
-    print(f'Epoch: {epoch:02d}, '
-          f'Loss: {loss:.4f}, '
-          f'Train: {100 * train_acc:.2f}%, '
-          f'Valid: {100 * valid_acc:.2f}% '
-          f'Test: {100 * test_acc:.2f}%')
+
+    if epoch % args['eval_every'] == 0:
+      train_acc = eval(model, device, train_loader, evaluator)[dataset.eval_metric]
+      test_acc = eval(model, device, test_loader, evaluator)[dataset.eval_metric]
+      print(f'Epoch: {epoch:02d}, '
+            f'Loss: {loss:.4f}, '
+            f'Train: {100 * train_acc:.2f}%, '
+            f'Valid: {100 * valid_acc:.2f}% '
+            f'Test: {100 * test_acc:.2f}%')
+    else:
+      print(f'Epoch: {epoch:02d}, '
+            f'Loss: {loss:.4f}, '
+            f'Valid: {100 * valid_acc:.2f}%')
 
 if 'IS_GRADESCOPE_ENV' not in os.environ:
   train_acc = eval(best_model, device, train_loader, evaluator)[dataset.eval_metric]
@@ -450,7 +635,6 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 from mpl_toolkits.mplot3d import Axes3D
-import statsmodels.api as sm
 # %matplotlib inline
 
 # Read in data
@@ -464,26 +648,17 @@ y_train = y_vals[0:149,:]
 x_test = x_vals[300:449,:]
 y_test = y_vals[300:449,:]
 
-X = np.vstack((class_one, class_two))
-m = len(X)
-B = np.reshape(np.ones(m), (565,1))
-
 # Add column of ones to account for bias term
-X_new = np.concatenate((B,X),axis=1)
-X_new_test = np.concatenate((B,x_test),axis=1)
-
-est=sm.OLS(y_train, X_new)
-results = est.fit()
-parameters = np.reshape(results.params, (52,1))
+X_new = np.concatenate((np.ones((len(x_train), 1), dtype=np.float32), x_train), axis=1)
+X_new_test = np.concatenate((np.ones((len(x_test), 1), dtype=np.float32), x_test), axis=1)
 
-# Convert numpy objects to tensors
-X_torch = torch.from_numpy(X_new)
-y_torch = torch.from_numpy(y_train)
-params_torch = torch.from_numpy(parameters)
-out_train = torch.from_numpy(X_new @ parameters)
-out_test = torch.from_numpy(X_new_test @ parameters)
+# Only the coefficients are used, so solve the least squares problem directly
+# in float32 rather than fitting a full statsmodels OLS with its diagnostics
+parameters = np.linalg.lstsq(X_new, y_train.astype(np.float32), rcond=None)[0]
+out_train = X_new @ parameters
+out_test = X_new_test @ parameters
 
-OLS_loss = loss_fn(out_train.squeeze(), y_torch.to(torch.float32).squeeze())
+OLS_loss = loss_fn(torch.from_numpy(out_train).squeeze(), torch.from_numpy(y_train).to(torch.float32).squeeze())
 OLS_loss
 
 def accuracy(pred, label):
@@ -492,20 +667,20 @@ def accuracy(pred, label):
 
   ############# Your code here ############       
   
-  pred = torch.where(pred > 0, 1, 0)
-  accu += (pred == label).sum().item()
-  accu = round(accu/pred.numel(), 4)
+  pred = (pred > 0).astype(np.int64)
+  accu += (pred == label).sum()
+  accu = round(accu/pred.size, 4)
   
   #########################################
 
   return accu
 
 # training accuracy
-accu = accuracy(out_train, y_torch)
+accu = accuracy(out_train, y_train)
 accu
 
 # test accuracy
-accu = accuracy(out_test, y_torch)
+accu = accuracy(out_test, y_test)
 accu
 
 """We note that this test accuracy is lower than that of our best model, of ~50%!"""
\ No newline at end of file